@@ -2,12 +2,15 @@ import logging
 import asyncio
 import sys
 import signal
-from telegram import Bot, Update
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
-from telegram.error import Conflict
+from telegram import InputMediaPhoto, Update
+from telegram.ext import AIORateLimiter, ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
+from telegram.error import BadRequest, Conflict
 
-from config import BOT_TOKEN, CHANNEL_ID, DEFAULT_PRODUCTS_COUNT, MAX_PRODUCTS_COUNT
-from scraper import scrape_products
+from config import (
+    BOT_TOKEN, CHANNEL_ID, DEFAULT_PRODUCTS_COUNT, LOCAL_BOT_API, MAX_PRODUCTS_COUNT,
+    USE_POLLING, WEBHOOK_HOST, WEBHOOK_LISTEN, WEBHOOK_PORT
+)
+from scraper import close_session, scrape_products
 from utils import format_product_message
 
 # Set up logging
@@ -21,18 +24,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Maximum number of channel posts in flight at once
+MAX_CONCURRENT_SENDS = 10
+
+# Telegram accepts between 2 and 10 items per media group
+MEDIA_GROUP_SIZE = 10
+
+# Photo captions are limited to 1024 characters (text messages allow 4096)
+MAX_CAPTION_LENGTH = 1024
+
 # Global variables
-bot = None
 application = None
 
 async def cleanup():
     """Cleanup function to close bot and application"""
-    global bot, application
-    if bot:
-        await bot.close()
+    global application
     if application:
+        await application.bot.close()
         await application.stop()
         await application.shutdown()
+    await close_session()
+
+async def on_shutdown(app) -> None:
+    """Release the shared scraper session when the application stops"""
+    await close_session()
 
 def signal_handler(signum, frame):
     """Handle system signals for graceful shutdown"""
@@ -82,21 +97,70 @@ async def post_products(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             await send_message(update, "No products found at the moment. Please try again later.")
             return
 
-        success_count = 0
-        for product in products:
-            try:
-                message = format_product_message(product)
+        # Flood control is handled by the application's rate limiter
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+
+        def get_message(product) -> str:
+            return product.get('_formatted') or format_product_message(product)
+
+        async def send_one(product) -> int:
+            async with semaphore:
+                message = get_message(product)
                 await context.bot.send_message(
                     chat_id=CHANNEL_ID,
                     text=message,
                     parse_mode="Markdown",
                     disable_web_page_preview=False
                 )
-                success_count += 1
-                await asyncio.sleep(0.5)  # Small delay between messages
-            except Exception as e:
-                logger.error(f"Error sending product message: {e}")
-                continue
+            return 1
+
+        async def send_album(batch) -> int:
+            try:
+                async with semaphore:
+                    media = [
+                        InputMediaPhoto(
+                            media=product['image'],
+                            caption=get_message(product),
+                            parse_mode="Markdown"
+                        )
+                        for product in batch
+                    ]
+                    await context.bot.send_media_group(chat_id=CHANNEL_ID, media=media)
+                return len(batch)
+            except BadRequest as e:
+                # A single rejected photo fails the whole album; retry each product on its own
+                logger.warning(f"Product album rejected, falling back to single messages: {e}")
+                results = await asyncio.gather(
+                    *[send_one(product) for product in batch],
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Error sending product message: {result}")
+                return sum(result for result in results if not isinstance(result, Exception))
+
+        # Products with images go out as albums, one API call per batch.
+        # Albums and single messages are sent concurrently, so channel order isn't preserved.
+        def fits_album(product) -> bool:
+            return bool(product.get('image')) and len(get_message(product)) <= MAX_CAPTION_LENGTH
+
+        with_image = [product for product in products if fits_album(product)]
+        tasks = [send_one(product) for product in products if not fits_album(product)]
+        for i in range(0, len(with_image), MEDIA_GROUP_SIZE):
+            batch = with_image[i:i + MEDIA_GROUP_SIZE]
+            if len(batch) > 1:
+                tasks.append(send_album(batch))
+            else:
+                tasks.append(send_one(batch[0]))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        success_count = 0
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error sending product message: {result}")
+            else:
+                success_count += result
 
         if success_count > 0:
             await send_message(update, f"Successfully posted {success_count} products to the channel!")
@@ -135,18 +199,24 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 def main() -> None:
     """Start the bot"""
-    global bot, application
+    global application
     
     # Register signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
     try:
-        # Initialize bot
-        bot = Bot(token=BOT_TOKEN)
-        
         # Build application
-        application = ApplicationBuilder().token(BOT_TOKEN).build()
+        builder = ApplicationBuilder().token(BOT_TOKEN).rate_limiter(AIORateLimiter()).post_shutdown(on_shutdown)
+        if LOCAL_BOT_API:
+            # Talk to a nearby Bot API server instead of api.telegram.org; local_mode
+            # lets PTB handle the local file paths a --local server returns
+            builder = (
+                builder.base_url(f"{LOCAL_BOT_API}/bot")
+                .base_file_url(f"{LOCAL_BOT_API}/file/bot")
+                .local_mode(True)
+            )
+        application = builder.build()
         
         # Add handlers
         application.add_handler(CommandHandler("start", start))
@@ -157,8 +227,17 @@ def main() -> None:
         # Add error handler
         application.add_error_handler(error_handler)
         
-        logger.info("Starting bot...")
-        application.run_polling()
+        if USE_POLLING:
+            logger.info("Starting bot with polling...")
+            application.run_polling()
+        else:
+            logger.info("Starting bot with webhook...")
+            application.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=BOT_TOKEN,
+                webhook_url=f"https://{WEBHOOK_HOST}/{BOT_TOKEN}"
+            )
         
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
@@ -4,6 +4,16 @@ import os
 BOT_TOKEN = "YOUR_BOT_TOKEN"
 CHANNEL_ID = "YOUR_CHANNEL_ID"
 
+# Local Bot API server (e.g. "http://localhost:8081"); leave empty to use api.telegram.org
+LOCAL_BOT_API = ""
+
+# Webhook Configuration
+WEBHOOK_HOST = "YOUR_WEBHOOK_HOST"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = int(os.environ.get("PORT", "8443"))
+# Set USE_POLLING=1 to fall back to long polling for local development
+USE_POLLING = os.environ.get("USE_POLLING", "0") == "1"
+
 # EarnKaro Configuration
 EARNKARO_USERNAME = "YOUR USERNAME"
 EARNKARO_PASSWORD ="PASSWORD"
@@ -30,12 +40,16 @@ MAX_PRODUCTS_COUNT = 10
 MAX_RETRIES = 3
 REQUEST_TIMEOUT = 30
 RATE_LIMIT_DELAY = 5
+MAX_CONCURRENT_REQUESTS = 3
+# Average request rate: REQUEST_RATE requests per REQUEST_RATE_PERIOD seconds
+REQUEST_RATE = 1
+REQUEST_RATE_PERIOD = 2
 
 # Logging settings
 LOG_FILE = 'scraper.log'
 LOG_LEVEL = 'INFO'
 
 # Create cache directory if it doesn't exist
-CACHE_DIR = os.path.dirname(os.path.abspath(CACHE_FILE))
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR) 
+CACHE_DIR = os.path.dirname(os.path.abspath(CACHE_FILE)) or '.'
+os.makedirs(CACHE_DIR, exist_ok=True)
+
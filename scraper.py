@@ -5,12 +5,19 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Union
 import aiohttp
+from aiolimiter import AsyncLimiter
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from bs4 import BeautifulSoup
+import soupsieve as sv
 from urllib.parse import urljoin, quote
 import config
+from utils import format_product_message
 import random
+import re
 import time
-from fake_useragent import UserAgent
 
 # Configure logging
 logging.basicConfig(
@@ -23,53 +30,116 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Static pool of recent desktop browser user agents
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:120.0) Gecko/20100101 Firefox/120.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14.2; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36 OPR/104.0.0.0"
+)
+
+# Collapses runs of whitespace (including newlines) left over from scraped markup
+_WS_RE = re.compile(r'\s+')
+
+def _clean_text(text: str) -> str:
+    """Collapse internal whitespace and strip the ends of scraped text"""
+    return _WS_RE.sub(' ', text).strip()
+
+# Spaces requests out on average only when several are competing, unlike a fixed sleep
+_LIMITER = AsyncLimiter(max_rate=config.REQUEST_RATE, time_period=config.REQUEST_RATE_PERIOD)
+
+# Shared HTTP session so connections are pooled and kept alive across scrapes
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared aiohttp session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=20,
+                limit_per_host=5,
+                keepalive_timeout=75,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
+        )
+    return _session
+
+async def close_session() -> None:
+    """Close the shared aiohttp session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
 class EcommerceScraper:
     """Base class for e-commerce scrapers"""
+    PLATFORM = ""
+    BASE_URL = ""
+    CONTAINER_SELECTORS: List[str] = []
+    
     def __init__(self):
         self.session = None
-        self.ua = UserAgent()
+        self.headers = {}
+        self.request_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_REQUESTS)
         self.products_cache = self.load_product_cache()
+        self.cache_dirty = False
         
     async def __aenter__(self):
         await self.setup_session()
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # The shared session stays open for reuse; see close_session()
+        self.session = None
+        # Write newly scraped categories once per scrape rather than per category
+        if self.cache_dirty:
+            self.save_to_cache(self.products_cache)
+            self.cache_dirty = False
         
     async def setup_session(self) -> None:
-        """Initialize aiohttp session with proper headers"""
+        """Attach the shared aiohttp session and prepare request headers"""
         if self.session is None:
-            self.session = aiohttp.ClientSession()
-            self.session.headers.update({
-                'User-Agent': self.ua.random,
+            self.session = await get_session()
+            self.headers = {
+                'User-Agent': random.choice(USER_AGENTS),
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
                 'Accept-Encoding': 'gzip, deflate, br',
                 'Connection': 'keep-alive',
                 'Upgrade-Insecure-Requests': '1',
                 'Cache-Control': 'max-age=0'
-            })
+            }
             
     async def get_page(self, url: str, params: Optional[Dict] = None) -> Tuple[str, int]:
         """Get page content with retry logic"""
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                # Random delay between requests
-                await asyncio.sleep(random.uniform(1, 3))
-                
-                async with self.session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.text(), response.status
-                    elif response.status == 429:  # Too Many Requests
-                        wait_time = (attempt + 1) * 5
-                        logger.warning(f"Rate limited. Waiting {wait_time} seconds...")
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(f"Failed to fetch {url}. Status: {response.status}")
-                        return "", response.status
+                # Bound in-flight requests per host to avoid triggering 429s
+                async with self.request_semaphore, _LIMITER:
+                    async with self.session.get(url, params=params, headers=self.headers) as response:
+                        if response.status == 200:
+                            # Both sites serve UTF-8; decode directly instead of sniffing the charset
+                            raw = await response.read()
+                            return raw.decode('utf-8', errors='replace'), response.status
+                        elif response.status == 429:  # Too Many Requests
+                            wait_time = (attempt + 1) * 5
+                            logger.warning(f"Rate limited. Waiting {wait_time} seconds...")
+                        else:
+                            logger.error(f"Failed to fetch {url}. Status: {response.status}")
+                            return "", response.status
+                # Back off only after releasing the connection and the concurrency slot
+                await asyncio.sleep(wait_time)
             except Exception as e:
                 logger.error(f"Error fetching {url}: {str(e)}")
                 if attempt < max_retries - 1:
@@ -78,12 +148,79 @@ class EcommerceScraper:
                     return "", 500
         return "", 500
 
+    def parse_page(self, html: str) -> List[Dict]:
+        """Parse a search results page into product dicts"""
+        soup = BeautifulSoup(html, 'lxml')
+        products = []
+        
+        # One grouped query finds every candidate container in a single walk of the page;
+        # the per-selector matchers then keep the highest priority selector that hit
+        candidates = self.CONTAINER_QUERY.select(soup)
+        for selector, matcher in zip(self.CONTAINER_SELECTORS, self.CONTAINER_MATCHERS):
+            containers = [candidate for candidate in candidates if matcher.match(candidate)]
+            if containers:
+                logger.info(f"Found {len(containers)} containers with selector: {selector}")
+                for container in containers:
+                    product = self.extract_product_info(container)
+                    if product:
+                        products.append(product)
+                break
+                
+        return products
+
+    def absolute_url(self, href: str) -> str:
+        """Resolve a scraped href against BASE_URL"""
+        # Site-relative paths are the common case; avoid urljoin's full parse for them
+        if href.startswith('/') and not href.startswith('//'):
+            return self.BASE_URL + href
+        return urljoin(self.BASE_URL, href)
+
+    async def get_products(self, category: str) -> Tuple[List[Dict], int]:
+        """Get products for a category, serving fresh cached results when available"""
+        if self.session is None:
+            raise RuntimeError("session not initialized; use the scraper with 'async with'")
+            
+        cached = self.get_cached_products(category)
+        if cached is not None:
+            logger.info(f"Using {len(cached)} cached products for category: {category}")
+            return cached, 200
+            
+        products, status = await self.fetch_products(category)
+        if products:
+            self.cache_products(category, products)
+        return products, status
+
+    async def fetch_products(self, category: str) -> Tuple[List[Dict], int]:
+        """Fetch products for a category from the site"""
+        raise NotImplementedError
+
+    def get_cached_products(self, category: str) -> Optional[List[Dict]]:
+        """Return fresh cached products for a category, if any"""
+        entry = self.products_cache.get(f"{self.PLATFORM}:{category}")
+        if not isinstance(entry, dict) or 'timestamp' not in entry:
+            return None
+        try:
+            if datetime.fromisoformat(entry['timestamp']) + timedelta(days=config.CACHE_EXPIRY_DAYS) > datetime.now():
+                return entry.get('products')
+        except (TypeError, ValueError):
+            pass
+        return None
+
+    def cache_products(self, category: str, products: List[Dict]) -> None:
+        """Store scraped products for a category in the in-memory cache"""
+        self.products_cache[f"{self.PLATFORM}:{category}"] = {
+            'timestamp': datetime.now().isoformat(),
+            'products': products
+        }
+        self.cache_dirty = True
+
     def load_product_cache(self) -> Dict:
         """Load cached products from file"""
         try:
             if os.path.exists(config.CACHE_FILE):
-                with open(config.CACHE_FILE, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
+                with open(config.CACHE_FILE, 'rb') as f:
+                    data = f.read()
+                    cache = orjson.loads(data) if orjson else json.loads(data)
                     # Check if cache is expired
                     if datetime.fromisoformat(cache['timestamp']) + timedelta(days=config.CACHE_EXPIRY_DAYS) > datetime.now():
                         return cache['products']
@@ -98,20 +235,46 @@ class EcommerceScraper:
                 'timestamp': datetime.now().isoformat(),
                 'products': products
             }
-            with open(config.CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            if orjson:
+                data = orjson.dumps(cache, option=orjson.OPT_NON_STR_KEYS)
+            else:
+                data = json.dumps(cache, ensure_ascii=False).encode('utf-8')
+            with open(config.CACHE_FILE, 'wb') as f:
+                f.write(data)
         except Exception as e:
             logger.error(f"Error saving to cache: {str(e)}")
 
 class FlipkartScraper(EcommerceScraper):
     """Scraper for Flipkart products"""
+    PLATFORM = "Flipkart"
     BASE_URL = "https://www.flipkart.com"
     SEARCH_URL = f"{BASE_URL}/search"
     
-    async def get_products(self, category: str) -> Tuple[List[Dict], int]:
+    # Try multiple selectors for product containers
+    CONTAINER_SELECTORS = [
+        'div._1xHGtK._373qXS',  # Grid view
+        'div._2kHMtA',  # List view
+        'div._1AtVbE',  # Alternative container
+        'div._4ddWXP',  # New grid view
+        'div._2B099V'   # New list view
+    ]
+    CONTAINER_QUERY = sv.compile(', '.join(CONTAINER_SELECTORS))
+    CONTAINER_MATCHERS = [sv.compile(selector) for selector in CONTAINER_SELECTORS]
+    
+    # Field selectors are compiled once and shared by every container lookup
+    FIELD_SELECTORS = {
+        'title': sv.compile('div._4rR01T, div._2WkVRV, div._2B099V, div._3pLy-c, div._4ddWXP'),
+        'description': sv.compile('a.IRpwTa, a._2UzuFa, a._3Djpdu, div._3pLy-c, div._4ddWXP'),
+        'price': sv.compile('div._30jeq3, div._30jeq3._1_WHN1, div._30jeq3._16Jk6d, div._30jeq3._3qU9Bn'),
+        'rating': sv.compile('div._3LWZlK, span._2_R_DZ, div._3LWZlK._1rdVr6'),
+        'reviews': sv.compile('span._2_R_DZ, span._2_R_DZ span, span._3LWZlK._1rdVr6'),
+        'link': sv.compile('a._1fQZEK, a._2UzuFa, a._3Djpdu, a._2rpwqI'),
+        'image': sv.compile('img._396cs4, img._2r_T1I, img._2r_T1I._2r_T1I, img._396cs4._3exPp9')
+    }
+    
+    async def fetch_products(self, category: str) -> Tuple[List[Dict], int]:
         """Fetch products from Flipkart with status code"""
         try:
-            await self.setup_session()
             params = {
                 'q': category,
                 'otracker': 'search',
@@ -127,27 +290,8 @@ class FlipkartScraper(EcommerceScraper):
                 logger.error(f"Failed to fetch Flipkart page. Status: {status}")
                 return [], status
                 
-            soup = BeautifulSoup(html, 'html.parser')
-            products = []
-            
-            # Try multiple selectors for product containers
-            selectors = [
-                'div._1xHGtK._373qXS',  # Grid view
-                'div._2kHMtA',  # List view
-                'div._1AtVbE',  # Alternative container
-                'div._4ddWXP',  # New grid view
-                'div._2B099V'   # New list view
-            ]
-            
-            for selector in selectors:
-                containers = soup.select(selector)
-                if containers:
-                    logger.info(f"Found {len(containers)} containers with selector: {selector}")
-                    for container in containers:
-                        product = self.extract_product_info(container)
-                        if product:
-                            products.append(product)
-                    break
+            # Parse in a worker thread so concurrent scrapes don't block the event loop
+            products = await asyncio.to_thread(self.parse_page, html)
                     
             logger.info(f"Found {len(products)} products for category: {category}")
             return products, status
@@ -160,29 +304,31 @@ class FlipkartScraper(EcommerceScraper):
         """Extract product information from container"""
         try:
             # Try multiple selectors for each field
-            title = container.select_one('div._4rR01T, div._2WkVRV, div._2B099V, div._3pLy-c, div._4ddWXP')
-            description = container.select_one('a.IRpwTa, a._2UzuFa, a._3Djpdu, div._3pLy-c, div._4ddWXP')
-            price = container.select_one('div._30jeq3, div._30jeq3._1_WHN1, div._30jeq3._16Jk6d, div._30jeq3._3qU9Bn')
-            rating = container.select_one('div._3LWZlK, span._2_R_DZ, div._3LWZlK._1rdVr6')
-            reviews = container.select_one('span._2_R_DZ, span._2_R_DZ span, span._3LWZlK._1rdVr6')
-            link = container.select_one('a._1fQZEK, a._2UzuFa, a._3Djpdu, a._2rpwqI')
-            image = container.select_one('img._396cs4, img._2r_T1I, img._2r_T1I._2r_T1I, img._396cs4._3exPp9')
+            title = self.FIELD_SELECTORS['title'].select_one(container)
+            description = self.FIELD_SELECTORS['description'].select_one(container)
+            price = self.FIELD_SELECTORS['price'].select_one(container)
+            rating = self.FIELD_SELECTORS['rating'].select_one(container)
+            reviews = self.FIELD_SELECTORS['reviews'].select_one(container)
+            link = self.FIELD_SELECTORS['link'].select_one(container)
+            image = self.FIELD_SELECTORS['image'].select_one(container)
             
             if not all([title, price, link]):
                 logger.warning("Missing required fields in product container")
                 return None
                 
             product = {
-                'title': title.text.strip(),
-                'description': description.text.strip() if description else '',
+                'title': _clean_text(title.text),
+                'description': _clean_text(description.text) if description else '',
                 'price': price.text.strip(),
                 'rating': rating.text.strip() if rating else 'No rating',
                 'reviews': reviews.text.strip() if reviews else 'No reviews',
-                'link': urljoin(self.BASE_URL, link['href']),
+                'link': self.absolute_url(link['href']),
                 'image': image['src'] if image else '',
                 'timestamp': datetime.now().isoformat(),
-                'platform': 'Flipkart'
+                'platform': self.PLATFORM
             }
+            # Format once here so the message travels with the product, including into the cache
+            product['_formatted'] = format_product_message(product)
             return product
         except Exception as e:
             logger.error(f"Error extracting product info: {str(e)}")
@@ -190,13 +336,34 @@ class FlipkartScraper(EcommerceScraper):
 
 class AmazonScraper(EcommerceScraper):
     """Scraper for Amazon products"""
+    PLATFORM = "Amazon"
     BASE_URL = "https://www.amazon.in"
     SEARCH_URL = f"{BASE_URL}/s"
     
-    async def get_products(self, category: str) -> Tuple[List[Dict], int]:
+    # Try multiple selectors for product containers
+    CONTAINER_SELECTORS = [
+        'div.s-result-item',  # Search result item
+        'div.a-section.a-spacing-base',  # Product container
+        'div.a-section.a-spacing-none',  # Alternative container
+        'div[data-component-type="s-search-result"]'  # New search result
+    ]
+    CONTAINER_QUERY = sv.compile(', '.join(CONTAINER_SELECTORS))
+    CONTAINER_MATCHERS = [sv.compile(selector) for selector in CONTAINER_SELECTORS]
+    
+    # Field selectors are compiled once and shared by every container lookup
+    FIELD_SELECTORS = {
+        'title': sv.compile('span.a-size-medium, span.a-size-base-plus, h2.a-size-mini'),
+        'description': sv.compile('a.a-link-normal, a.a-text-normal, h2.a-size-mini'),
+        'price': sv.compile('span.a-price-whole, span.a-offscreen, span.a-price'),
+        'rating': sv.compile('span.a-icon-alt, i.a-icon-star'),
+        'reviews': sv.compile('span.a-size-base, span.a-size-base.s-underline-text'),
+        'link': sv.compile('a.a-link-normal, a.a-text-normal'),
+        'image': sv.compile('img.s-image, img.a-dynamic-image')
+    }
+    
+    async def fetch_products(self, category: str) -> Tuple[List[Dict], int]:
         """Fetch products from Amazon with status code"""
         try:
-            await self.setup_session()
             params = {
                 'k': category,
                 'ref': 'nb_sb_noss',
@@ -208,26 +375,8 @@ class AmazonScraper(EcommerceScraper):
                 logger.error(f"Failed to fetch Amazon page. Status: {status}")
                 return [], status
                 
-            soup = BeautifulSoup(html, 'html.parser')
-            products = []
-            
-            # Try multiple selectors for product containers
-            selectors = [
-                'div.s-result-item',  # Search result item
-                'div.a-section.a-spacing-base',  # Product container
-                'div.a-section.a-spacing-none',  # Alternative container
-                'div[data-component-type="s-search-result"]'  # New search result
-            ]
-            
-            for selector in selectors:
-                containers = soup.select(selector)
-                if containers:
-                    logger.info(f"Found {len(containers)} containers with selector: {selector}")
-                    for container in containers:
-                        product = self.extract_product_info(container)
-                        if product:
-                            products.append(product)
-                    break
+            # Parse in a worker thread so concurrent scrapes don't block the event loop
+            products = await asyncio.to_thread(self.parse_page, html)
                     
             logger.info(f"Found {len(products)} products for category: {category}")
             return products, status
@@ -240,29 +389,31 @@ class AmazonScraper(EcommerceScraper):
         """Extract product information from container"""
         try:
             # Try multiple selectors for each field
-            title = container.select_one('span.a-size-medium, span.a-size-base-plus, h2.a-size-mini')
-            description = container.select_one('a.a-link-normal, a.a-text-normal, h2.a-size-mini')
-            price = container.select_one('span.a-price-whole, span.a-offscreen, span.a-price')
-            rating = container.select_one('span.a-icon-alt, i.a-icon-star')
-            reviews = container.select_one('span.a-size-base, span.a-size-base.s-underline-text')
-            link = container.select_one('a.a-link-normal, a.a-text-normal')
-            image = container.select_one('img.s-image, img.a-dynamic-image')
+            title = self.FIELD_SELECTORS['title'].select_one(container)
+            description = self.FIELD_SELECTORS['description'].select_one(container)
+            price = self.FIELD_SELECTORS['price'].select_one(container)
+            rating = self.FIELD_SELECTORS['rating'].select_one(container)
+            reviews = self.FIELD_SELECTORS['reviews'].select_one(container)
+            link = self.FIELD_SELECTORS['link'].select_one(container)
+            image = self.FIELD_SELECTORS['image'].select_one(container)
             
             if not all([title, price, link]):
                 logger.warning("Missing required fields in product container")
                 return None
                 
             product = {
-                'title': title.text.strip(),
-                'description': description.text.strip() if description else '',
+                'title': _clean_text(title.text),
+                'description': _clean_text(description.text) if description else '',
                 'price': price.text.strip(),
                 'rating': rating.text.strip() if rating else 'No rating',
                 'reviews': reviews.text.strip() if reviews else 'No reviews',
-                'link': urljoin(self.BASE_URL, link['href']),
+                'link': self.absolute_url(link['href']),
                 'image': image['src'] if image else '',
                 'timestamp': datetime.now().isoformat(),
-                'platform': 'Amazon'
+                'platform': self.PLATFORM
             }
+            # Format once here so the message travels with the product, including into the cache
+            product['_formatted'] = format_product_message(product)
             return product
         except Exception as e:
             logger.error(f"Error extracting product info: {str(e)}")
@@ -278,17 +429,38 @@ async def scrape_products(platform: str = 'flipkart', num_products: int = 5) ->
     """Scrape products from specified platform"""
     async with await get_scraper(platform) as scraper:
         all_products = []
+        seen_links = set()
         
-        for category in config.PRODUCT_CATEGORIES:
-            logger.info(f"Searching for {category} on {platform}...")
+        async def fetch(category: str) -> Tuple[str, List[Dict]]:
             products, status = await scraper.get_products(category)
-            if products:
-                logger.info(f"Found {len(products)} products for {category}")
-                all_products.extend(products)
-                if len(all_products) >= num_products:
-                    break
-            else:
-                logger.warning(f"No products found for {category}")
+            return category, products
+        
+        # Fetch all categories concurrently and stop as soon as we have enough products
+        logger.info(f"Searching for {', '.join(config.PRODUCT_CATEGORIES)} on {platform}...")
+        pending = [asyncio.create_task(fetch(category)) for category in config.PRODUCT_CATEGORIES]
+        try:
+            for next_result in asyncio.as_completed(pending):
+                try:
+                    category, products = await next_result
+                except Exception as e:
+                    logger.error(f"Error fetching category: {str(e)}")
+                    continue
+                if products:
+                    logger.info(f"Found {len(products)} products for {category}")
+                    # The same listing can show up under several categories
+                    for product in products:
+                        if product['link'] not in seen_links:
+                            seen_links.add(product['link'])
+                            all_products.append(product)
+                    if len(all_products) >= num_products:
+                        break
+                else:
+                    logger.warning(f"No products found for {category}")
+        finally:
+            # Cancel fetches that are no longer needed and wait for them to unwind
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
         
         return all_products[:num_products]
 
@@ -361,6 +533,8 @@ async def main():
     except Exception as e:
         logger.error(f"Error in main function: {e}")
         raise
+    finally:
+        await close_session()
 
 if __name__ == "__main__":
     try:
@@ -3,19 +3,19 @@ from config import EARNKARO_TRACKING_ID
 
 def format_product_message(product):
     """Format product information into a message"""
-    message = f"*{product['name']}*\n\n"
+    message = f"*{product['title']}*\n\n"
     
     if product['price']:
         message += f"💰 *Price:* {product['price']}\n"
     
-    if product['discount']:
+    if product.get('discount'):
         message += f"🎯 *Discount:* {product['discount']}\n"
     
     if product['rating']:
         message += f"⭐ *Rating:* {product['rating']}\n"
     
-    message += f"\n🛍️ *Available on:* {product['site']}\n"
-    message += f"\n🔗 [Buy Now]({product['url']})"
+    message += f"\n🛍️ *Available on:* {product['platform']}\n"
+    message += f"\n🔗 [Buy Now]({product['link']})"
     
     return message
 